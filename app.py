@@ -22,7 +22,7 @@ from data_juicer.core import Analyser, Executor
 from data_juicer.ops.base_op import OPERATORS
 from data_juicer.utils.constant import Fields, StatsKeys
 from data_juicer.utils.logger_utils import get_log_file_path
-from data_juicer.utils.model_utils import MODEL_ZOO, prepare_model
+from data_juicer.utils.model_utils import get_model, prepare_model
 
 
 @st.cache_data
@@ -41,7 +41,7 @@ def convert_to_jsonl(df):
 @st.cache_data
 def get_diversity_model(lang):
     model_key = prepare_model('spacy', lang=lang)
-    diversity_model = MODEL_ZOO.get(model_key)
+    diversity_model = get_model(model_key)
     return diversity_model
 
 
@@ -8,6 +8,7 @@ from data_juicer.format import load_formatter
 from data_juicer.ops import Filter, load_ops
 from data_juicer.utils import cache_utils
 from data_juicer.utils.constant import Fields
+from data_juicer.utils.model_utils import collect_model_keys, prewarm_models
 
 from .data import add_same_content_to_new_column
 from .exporter import Exporter
@@ -97,6 +98,8 @@ class Analyser:
                                           },
                                           num_proc=self.cfg.np,
                                           desc='Adding new column for stats')
+                # load models once before forking workers for this op
+                prewarm_models(collect_model_keys(op))
                 dataset = dataset.map(op.compute_stats,
                                       num_proc=self.cfg.np,
                                       desc=op_name + '_compute_stats')
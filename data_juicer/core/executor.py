@@ -11,6 +11,7 @@ from data_juicer.ops import (OPERATORS, Deduplicator, Filter, Mapper, Selector,
 from data_juicer.utils import cache_utils
 from data_juicer.utils.ckpt_utils import CheckpointManager
 from data_juicer.utils.constant import Fields
+from data_juicer.utils.model_utils import collect_model_keys, prewarm_models
 
 from .data import add_same_content_to_new_column
 from .exporter import Exporter
@@ -122,6 +123,8 @@ class Executor:
             else:
                 op_proc = self.cfg.np
                 with_rank = False
+            # load models once before forking workers for this op
+            prewarm_models(collect_model_keys(op))
             try:
                 if isinstance(op, Mapper):
                     tmp = dataset.map(function=op.process,
@@ -122,7 +122,8 @@ class ImageTextMatchingFilter(Filter):
                                    max_position_embeddings,
                                    padding=True).to(model.device)
 
-                outputs = model(**inputs)
+                with torch.inference_mode():
+                    outputs = model(**inputs)
                 itm_scores = outputs.itm_score.detach().cpu().softmax(
                     dim=-1)[:, 1]
 
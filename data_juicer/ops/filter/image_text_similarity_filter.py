@@ -122,7 +122,8 @@ class ImageTextSimilarityFilter(Filter):
                                    max_position_embeddings,
                                    padding=True).to(model.device)
 
-                outputs = model(**inputs)
+                with torch.inference_mode():
+                    outputs = model(**inputs)
                 chunk_logits = outputs.logits_per_text.detach().cpu() / 100.0
 
                 if self.reduce_mode == 'avg':
@@ -196,7 +196,7 @@ class PhraseGroundingRecallFilter(Filter):
                                    padding=True,
                                    truncation=True).to(model.device)
 
-                with torch.no_grad():
+                with torch.inference_mode():
                     outputs = model(**inputs)
                     target_sizes = torch.tensor([
                         img.size[::-1] for img in images_this_chunk
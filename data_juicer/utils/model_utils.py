@@ -1,16 +1,33 @@
 import fnmatch
+import hashlib
+import json
 import os
+import re
+import shutil
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import partial
+from urllib.parse import urljoin
 
+import fasteners
 import multiprocess as mp
-import wget
+import requests
 from loguru import logger
 
-from data_juicer import use_cuda
+from data_juicer import cuda_device_count, use_cuda
 
 from .cache_utils import DATA_JUICER_MODELS_CACHE as DJMC
 
-MODEL_ZOO = {}
+# Loaded models in least recently used order, at most MAX_MODELS of them.
+# They are keyed by the loading function and its arguments, so that the
+# same model is loaded only once for identical model keys
+MODEL_ZOO = OrderedDict()
+MAX_MODELS = 8
+
+# Models resolved by `get_model` in this process, mapping
+# (model key, rank) to (key in MODEL_ZOO, model)
+_RESOLVED_MODELS = {}
 
 # Default cached models links for downloading
 MODEL_LINKS = 'https://dail-wlcb.oss-cn-wulanchabu.aliyuncs.com/' \
@@ -34,12 +51,167 @@ BACKUP_MODEL_LINKS = {
     'data_juicer/models/'
 }
 
+# Backup links with their patterns compiled ahead of lookups. Names and
+# patterns are normalized by `os.path.normcase` as `fnmatch.fnmatch` does
+_COMPILED_BACKUP_MODEL_LINKS = [
+    (re.compile(fnmatch.translate(os.path.normcase(pattern))), url)
+    for pattern, url in BACKUP_MODEL_LINKS.items()
+]
+
 
 def get_backup_model_link(model_name):
-    for pattern, url in BACKUP_MODEL_LINKS.items():
-        if fnmatch.fnmatch(model_name, pattern):
-            return url
-    return None
+    model_name = os.path.normcase(model_name)
+    return next((url for regex, url in _COMPILED_BACKUP_MODEL_LINKS
+                 if regex.match(model_name)), None)
+
+
+def get_model_link(base_link, model_name):
+    """
+    Build the download link of a model from a base link. `os.path.join` is
+    not used here since it is not URL-safe on Windows.
+
+    :param base_link: base link of the models
+    :param model_name: a specified model name
+    :return: the download link of the model
+    """
+    if not base_link.endswith('/'):
+        base_link += '/'
+    return urljoin(base_link, model_name)
+
+
+def _get_validator(response):
+    # weak ETags can not be used in If-Range
+    etag = response.headers.get('ETag')
+    if etag is not None and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def _get_part_path(dest, url):
+    # each link downloads into its own part file, so that falling back to
+    # another mirror does not discard the bytes downloaded from this one
+    digest = hashlib.sha256(url.encode()).hexdigest()[:8]
+    return f'{dest}.{digest}.part'
+
+
+def _remove_part(dest, url):
+    part_path = _get_part_path(dest, url)
+    for path in (part_path, part_path + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _download_with_resume(url, dest, chunk_size=1 << 20, timeout=30):
+    """
+    Stream a file from url into dest. Bytes are written to a part file of
+    the url next to dest first, so an interrupted download can be resumed
+    from where it stopped by a HTTP Range request. The part file is renamed
+    to dest on success.
+
+    The source url and the ETag (or Last-Modified) of the part file are
+    recorded in a json file next to it. A part file is only resumed with
+    an If-Range on its validator, so a stale part file of an outdated
+    remote file is downloaded again.
+
+    :param url: the link to download from
+    :param dest: the final path of the downloaded file
+    :param chunk_size: size of each chunk written to disk
+    :param timeout: timeout in seconds for the connection
+    :return: the final path of the downloaded file
+    """
+    part_path = _get_part_path(dest, url)
+    meta_path = part_path + '.json'
+
+    offset, headers = 0, {}
+    if os.path.exists(part_path):
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        if meta.get('url') == url and meta.get('validator') is not None:
+            offset = os.path.getsize(part_path)
+            headers = {
+                'Range': f'bytes={offset}-',
+                'If-Range': meta['validator'],
+            }
+
+    with requests.get(url, headers=headers, stream=True,
+                      timeout=timeout) as response:
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code == 416 or (
+                response.status_code == 206
+                and not content_range.startswith(f'bytes {offset}-')):
+            # the part file is not resumable against the remote one
+            os.remove(part_path)
+            return _download_with_resume(url, dest, chunk_size, timeout)
+        response.raise_for_status()
+
+        if response.status_code == 206:
+            mode = 'ab'
+        else:
+            # the server ignores the Range header or the remote file has
+            # changed, download from scratch
+            mode, offset = 'wb', 0
+            meta = {'url': url, 'validator': _get_validator(response)}
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+        # Content-Length is not the size on disk for encoded responses
+        content_length = response.headers.get('Content-Length')
+        expected_size = offset + int(content_length) \
+            if content_length is not None and \
+            'Content-Encoding' not in response.headers else None
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+
+    # verify the size to detect incomplete files
+    if expected_size is not None and \
+            os.path.getsize(part_path) != expected_size:
+        raise requests.RequestException(
+            f'Incomplete download of [{url}]: expected {expected_size} '
+            f'bytes, got {os.path.getsize(part_path)} bytes.')
+    os.replace(part_path, dest)
+    os.remove(meta_path)
+    return dest
+
+
+def _race_mirrors(urls, timeout=5):
+    """
+    Probe the links concurrently by HEAD requests and return the first
+    one that is available, so that an unreachable mirror does not stall
+    the download by its timeout.
+
+    :param urls: links to probe
+    :param timeout: timeout in seconds for each probe
+    :return: the first available link, or None if none is available
+    """
+    if len(urls) <= 1:
+        return urls[0] if urls else None
+
+    def probe(url):
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+        response.raise_for_status()
+        return url
+
+    executor = ThreadPoolExecutor(max_workers=len(urls))
+    try:
+        futures = [executor.submit(probe, url) for url in urls]
+        for future in as_completed(futures):
+            if future.exception() is None:
+                return future.result()
+        return None
+    finally:
+        # do not wait for the slower probes
+        executor.shutdown(wait=False)
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
 
 
 def check_model(model_name, force=False):
@@ -57,35 +229,71 @@ def check_model(model_name, force=False):
     if os.path.exists(model_name):
         return model_name
 
-    if not os.path.exists(DJMC):
-        os.makedirs(DJMC)
+    os.makedirs(DJMC, exist_ok=True)
 
     # check if the specified model exists. If it does not exist, download it
     cached_model_path = os.path.join(DJMC, model_name)
-    if force:
-        if os.path.exists(cached_model_path):
-            os.remove(cached_model_path)
-            logger.info(
-                f'Model [{cached_model_path}] invalid, force to downloading...'
-            )
+    last_mtime = _get_mtime(cached_model_path)
+    if last_mtime is not None and not force:
+        return cached_model_path
+
+    # only one process downloads the model at a time, the others wait
+    # for it and reuse its download. The model is downloaded to a part file
+    # and renamed when it's complete, so an existing invalid model is kept
+    # until it's replaced and an interrupted download can be resumed
+    with fasteners.InterProcessLock(cached_model_path + '.lock'):
+        mtime = _get_mtime(cached_model_path)
+        if mtime is not None and mtime != last_mtime:
+            return cached_model_path
+
+        if last_mtime is not None:
+            logger.info(f'Model [{cached_model_path}] invalid, force to '
+                        f'downloading...')
         else:
             logger.info(
                 f'Model [{cached_model_path}] not found . Downloading...')
 
-        try:
-            model_link = os.path.join(MODEL_LINKS, model_name)
-            wget.download(model_link, cached_model_path, bar=None)
-        except:  # noqa: E722
+        model_links = [get_model_link(MODEL_LINKS, model_name)]
+        backup_link = get_backup_model_link(model_name)
+        if backup_link is not None:
+            backup_model_link = get_model_link(backup_link, model_name)
+            if backup_model_link not in model_links:
+                model_links.append(backup_model_link)
+
+        part_sizes = {
+            link: os.path.getsize(_get_part_path(cached_model_path, link))
+            for link in model_links
+            if os.path.exists(_get_part_path(cached_model_path, link))
+        }
+        if part_sizes:
+            # resume the largest partial download first instead of
+            # starting over from the fastest mirror
+            model_links.sort(key=lambda link: part_sizes.get(link, -1),
+                             reverse=True)
+        else:
+            # download from the fastest available link first and the
+            # others as fallbacks
+            fastest_link = _race_mirrors(model_links)
+            if fastest_link is not None:
+                model_links.remove(fastest_link)
+                model_links.insert(0, fastest_link)
+        for model_link in model_links:
             try:
-                backup_model_link = os.path.join(
-                    get_backup_model_link(model_name), model_name)
-                wget.download(backup_model_link, cached_model_path, bar=None)
-            except:  # noqa: E722
-                logger.error(
-                    f'Downloading model [{model_name}] error. '
-                    f'Please retry later or download it into {DJMC} '
-                    f'manually from {model_link} or {backup_model_link} ')
-                exit(1)
+                _download_with_resume(model_link, cached_model_path)
+                # partial downloads from the other links are useless now
+                for link in model_links:
+                    _remove_part(cached_model_path, link)
+                break
+            except requests.RequestException as e:
+                # network errors fall back to the next link, while the
+                # filesystem errors are raised directly
+                logger.warning(f'Downloading model [{model_name}] from '
+                               f'[{model_link}] error: {e}')
+        else:
+            logger.error(f'Downloading model [{model_name}] error. '
+                         f'Please retry later or download it into {DJMC} '
+                         f'manually from {" or ".join(model_links)} ')
+            exit(1)
     return cached_model_path
 
 
@@ -101,7 +309,8 @@ def prepare_fasttext_model(model_name='lid.176.bin'):
     logger.info('Loading fasttext language identification model...')
     try:
         ft_model = fasttext.load_model(check_model(model_name))
-    except:  # noqa: E722
+    except Exception as e:
+        logger.warning(f'Loading model [{model_name}] error: {e}')
         ft_model = fasttext.load_model(check_model(model_name, force=True))
     return ft_model
 
@@ -122,7 +331,8 @@ def prepare_sentencepiece_model(lang, name_pattern='{}.sp.model'):
     sentencepiece_model = sentencepiece.SentencePieceProcessor()
     try:
         sentencepiece_model.load(check_model(model_name))
-    except:  # noqa: E722
+    except Exception as e:
+        logger.warning(f'Loading model [{model_name}] error: {e}')
         sentencepiece_model.load(check_model(model_name, force=True))
     return sentencepiece_model
 
@@ -142,7 +352,8 @@ def prepare_kenlm_model(lang, name_pattern='{}.arpa.bin'):
     logger.info('Loading kenlm language model...')
     try:
         kenlm_model = kenlm.Model(check_model(model_name))
-    except:  # noqa: E722
+    except Exception as e:
+        logger.warning(f'Loading model [{model_name}] error: {e}')
         kenlm_model = kenlm.Model(check_model(model_name, force=True))
     return kenlm_model
 
@@ -171,26 +382,67 @@ def prepare_nltk_model(lang, name_pattern='punkt.{}.pickle'):
     logger.info('Loading nltk punkt split model...')
     try:
         nltk_model = load(check_model(model_name))
-    except:  # noqa: E722
+    except Exception as e:
+        logger.warning(f'Loading model [{model_name}] error: {e}')
         nltk_model = load(check_model(model_name, force=True))
     return nltk_model
 
 
+def _snapshot_huggingface_model(repo_id, max_workers=8):
+    """
+    Download the files needed to load a HuggingFace model into the local
+    HuggingFace cache. If the hub is not reachable, `snapshot_download`
+    returns the snapshot in the local cache instead.
+
+    :param repo_id: model id on the HuggingFace hub
+    :param max_workers: number of files downloaded concurrently
+    :return: local path to the snapshot of the model
+    """
+    from huggingface_hub import snapshot_download
+
+    # only the weights loaded by `from_pretrained` are fetched: a single
+    # file, or the shards named by `save_pretrained` with their index json.
+    # Other copies of the weights (e.g. consolidated.safetensors) are not
+    allow_patterns = [
+        '*.json', '*.model', '*.txt', '*.py', 'model.safetensors',
+        'model-*-of-*.safetensors'
+    ]
+    local_path = snapshot_download(repo_id=repo_id,
+                                   max_workers=max_workers,
+                                   allow_patterns=allow_patterns)
+    # fall back to pytorch weights only when there are no safetensors ones,
+    # so that the weights are never downloaded twice
+    if not any(f.endswith('.safetensors') for f in os.listdir(local_path)):
+        local_path = snapshot_download(
+            repo_id=repo_id,
+            max_workers=max_workers,
+            allow_patterns=['pytorch_model.bin', 'pytorch_model-*-of-*.bin'])
+    return local_path
+
+
 def prepare_huggingface_model(pretrained_model_name_or_path,
                               return_model=True,
-                              trust_remote_code=False):
+                              trust_remote_code=False,
+                              torch_dtype=None,
+                              load_in_8bit=False,
+                              load_in_4bit=False):
     """
     Prepare and load a HuggingFace model with the correspoding processor.
 
     :param pretrained_model_name_or_path: model name or path
     :param return_model: return model or not
     :param trust_remote_code: passed to transformers
+    :param torch_dtype: the dtype to load the model weights in. It can be
+        'auto', 'float32', 'float16' or 'bfloat16'. The default dtype (fp32)
+        is used if it's None.
+    :param load_in_8bit: load the model with 8-bit quantization. Quantized
+        models can only be loaded on a single CUDA device.
+    :param load_in_4bit: load the model with 4-bit quantization
     :return: a tuple (model, input processor) if `return_model` is True;
-        otherwise, only the processor is returned.
+        otherwise, only the tokenizer is returned.
     """
     import transformers
-    from transformers import (AutoConfig, AutoImageProcessor, AutoProcessor,
-                              AutoTokenizer)
+    from transformers import AutoImageProcessor, AutoProcessor, AutoTokenizer
     from transformers.models.auto.image_processing_auto import \
         IMAGE_PROCESSOR_MAPPING_NAMES
     from transformers.models.auto.processing_auto import \
@@ -198,11 +450,46 @@ def prepare_huggingface_model(pretrained_model_name_or_path,
     from transformers.models.auto.tokenization_auto import \
         TOKENIZER_MAPPING_NAMES
 
-    config = AutoConfig.from_pretrained(pretrained_model_name_or_path)
+    if load_in_8bit and load_in_4bit:
+        raise ValueError('Only one of load_in_8bit and load_in_4bit can be '
+                         'enabled for huggingface model.')
+
+    if torch_dtype not in [None, 'auto', 'float32', 'float16', 'bfloat16']:
+        raise ValueError(
+            f'Not support {torch_dtype} torch_dtype for huggingface model. '
+            'Can only be one of '
+            '["auto", "float32", "float16", "bfloat16"].')
+
+    if not use_cuda() and (load_in_8bit or load_in_4bit):
+        raise ValueError('In cpu mode, quantized loading can not be used for '
+                         'huggingface model.')
+
+    if cuda_device_count() > 1 and (load_in_8bit or load_in_4bit):
+        raise ValueError('Quantized models can not be moved to the device of '
+                         'each process, so quantized loading can only be '
+                         'used for huggingface model with one CUDA device.')
+
+    if not return_model:
+        # only the tokenizer is needed, so neither the config nor the
+        # model weights are fetched
+        return AutoTokenizer.from_pretrained(
+            pretrained_model_name_or_path,
+            use_fast=True,
+            trust_remote_code=trust_remote_code)
+
+    if not os.path.isdir(pretrained_model_name_or_path):
+        # fetch config, processor and weights files in one parallel and
+        # resumable download, then load everything from the local snapshot
+        pretrained_model_name_or_path = _snapshot_huggingface_model(
+            pretrained_model_name_or_path)
+
+    # read the local config once instead of resolving it by AutoConfig
+    with open(os.path.join(pretrained_model_name_or_path, 'config.json')) as f:
+        config = json.load(f)
     # TODO: What happens when there are more than one?
-    arch = config.architectures[0]
+    arch = config['architectures'][0]
     model_class = getattr(transformers, arch)
-    model_type = config.model_type
+    model_type = config['model_type']
     if model_type in PROCESSOR_MAPPING_NAMES:
         processor = AutoProcessor.from_pretrained(
             pretrained_model_name_or_path, trust_remote_code=trust_remote_code)
@@ -210,14 +497,97 @@ def prepare_huggingface_model(pretrained_model_name_or_path,
         processor = AutoImageProcessor.from_pretrained(
             pretrained_model_name_or_path, trust_remote_code=trust_remote_code)
     elif model_type in TOKENIZER_MAPPING_NAMES:
+        # prefer the Rust-backed fast tokenizers when they are available
         processor = AutoTokenizer.from_pretrained(
-            pretrained_model_name_or_path, trust_remote_code=trust_remote_code)
+            pretrained_model_name_or_path,
+            use_fast=True,
+            trust_remote_code=trust_remote_code)
     else:
         processor = None
 
-    if return_model:
-        model = model_class.from_pretrained(pretrained_model_name_or_path)
-    return (model, processor) if return_model else processor
+    load_kwargs = {'trust_remote_code': trust_remote_code}
+    if torch_dtype == 'auto':
+        load_kwargs['torch_dtype'] = torch_dtype
+    elif torch_dtype is not None:
+        import torch
+        load_kwargs['torch_dtype'] = getattr(torch, torch_dtype)
+    if load_in_8bit or load_in_4bit:
+        import torch
+        from transformers import BitsAndBytesConfig
+        load_kwargs['quantization_config'] = BitsAndBytesConfig(
+            load_in_8bit=load_in_8bit,
+            load_in_4bit=load_in_4bit,
+            bnb_4bit_compute_dtype=torch.bfloat16)
+        # quantized models can not be moved after loading, so they are
+        # placed on the only device, which is the one of rank 0
+        load_kwargs['device_map'] = {'': 'cuda:0'}
+    model = model_class.from_pretrained(pretrained_model_name_or_path,
+                                        **load_kwargs)
+    return model, processor
+
+
+def _file_crc32(path, chunk_size=1 << 20):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _extract_zip_member(zf, member, target_dir, chunk_size=1 << 20):
+    """
+    Stream-extract a single member of a zip file in fixed-size chunks.
+    Members already extracted with a matching CRC32 are skipped.
+
+    :param zf: an opened `zipfile.ZipFile`
+    :param member: the `zipfile.ZipInfo` to extract
+    :param target_dir: directory to extract the member into
+    :param chunk_size: size of each chunk copied to disk
+    """
+    target_dir = os.path.realpath(target_dir)
+    target = os.path.realpath(os.path.join(target_dir, member.filename))
+    if os.path.commonpath([target_dir, target]) != target_dir:
+        raise ValueError(f'Illegal path [{member.filename}] in zip file.')
+
+    if member.is_dir():
+        os.makedirs(target, exist_ok=True)
+        return
+    if os.path.isfile(target) and \
+            os.path.getsize(target) == member.file_size and \
+            _file_crc32(target) == member.CRC:
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with zf.open(member) as src, open(target, 'wb') as dst:
+        shutil.copyfileobj(src, dst, length=chunk_size)
+
+
+def _decompress_model(compressed_model_path, target_dir, force=False):
+    """
+    Decompress a zipped model into target_dir if it's not decompressed.
+    A marker file is written next to the decompressed model when all the
+    members are extracted, so an interrupted extraction is resumed by the
+    next call, which skips the members already extracted.
+
+    :param compressed_model_path: path to the zipped model
+    :param target_dir: directory to extract the model into
+    :param force: whether to verify all the members even if the model has
+        been decompressed
+    :return: path to the decompressed model
+    """
+    import zipfile
+
+    decompressed_model_path = compressed_model_path.replace('.zip', '')
+    marker_path = decompressed_model_path + '.extracted'
+    if os.path.exists(marker_path):
+        if not force and os.path.isdir(decompressed_model_path):
+            return decompressed_model_path
+        os.remove(marker_path)
+
+    with zipfile.ZipFile(compressed_model_path) as zf:
+        for member in zf.infolist():
+            _extract_zip_member(zf, member, target_dir)
+    open(marker_path, 'w').close()
+    return decompressed_model_path
 
 
 def prepare_spacy_model(lang, name_pattern='{}_core_web_md-3.5.0'):
@@ -235,23 +605,15 @@ def prepare_spacy_model(lang, name_pattern='{}_core_web_md-3.5.0'):
     logger.info(f'Loading spacy model [{model_name}]...')
     compressed_model = '{}.zip'.format(model_name)
 
-    # decompress the compressed model if it's not decompressed
-    def decompress_model(compressed_model_path):
-        decompressed_model_path = compressed_model_path.replace('.zip', '')
-        if os.path.exists(decompressed_model_path) \
-                and os.path.isdir(decompressed_model_path):
-            return decompressed_model_path
-        import zipfile
-        with zipfile.ZipFile(compressed_model_path) as zf:
-            zf.extractall(DJMC)
-        return decompressed_model_path
-
     try:
         diversity_model = spacy.load(
-            decompress_model(check_model(compressed_model)))
-    except:  # noqa: E722
+            _decompress_model(check_model(compressed_model), DJMC))
+    except Exception as e:
+        logger.warning(f'Loading model [{compressed_model}] error: {e}')
         diversity_model = spacy.load(
-            decompress_model(check_model(compressed_model, force=True)))
+            _decompress_model(check_model(compressed_model, force=True),
+                              DJMC,
+                              force=True))
     return diversity_model
 
 
@@ -319,16 +681,29 @@ MODEL_FUNCTION_MAPPING = {
 }
 
 
-def prepare_model(model_type, **model_kwargs):
+def prepare_model(model_type, lazy=True, **model_kwargs):
+    """
+    Register a model and return its key for `get_model`.
+
+    :param model_type: type of the model, one of the keys in
+        MODEL_FUNCTION_MAPPING
+    :param lazy: whether to defer loading the model to the first
+        `get_model` call. Lazy loading is right for pipelines where only
+        worker processes use the model, since a model loaded on the main
+        process would be wasted memory there. Eager loading is right when
+        the main process uses the model itself.
+    :param model_kwargs: arguments passed to the model loading function
+    :return: the model key
+    """
     assert (model_type in MODEL_FUNCTION_MAPPING.keys()
             ), 'model_type must be one of the following: {}'.format(
                 list(MODEL_FUNCTION_MAPPING.keys()))
-    global MODEL_ZOO
     model_func = MODEL_FUNCTION_MAPPING[model_type]
     model_key = partial(model_func, **model_kwargs)
-    # always instantiate once for possible caching
-    model_objects = model_key()
-    MODEL_ZOO[model_key] = model_objects
+    if not lazy:
+        zoo_key = _get_zoo_key(model_key)
+        if zoo_key not in MODEL_ZOO:
+            _add_to_model_zoo(zoo_key, model_key())
     return model_key
 
 
@@ -338,26 +713,136 @@ def move_to_cuda(model, rank):
         model = (model, )
 
     for module in model:
+        if str(getattr(module, 'device', None)) == f'cuda:{rank}':
+            continue
+        if getattr(module, 'is_quantized', False):
+            # quantized models are placed on devices when loading and
+            # can not be moved by `to`
+            raise ValueError(
+                f'Quantized {module.__class__.__name__} is on device '
+                f'{module.device} and can not be moved to CUDA device '
+                f'{rank}.')
         if callable(getattr(module, 'to', None)):
             logger.info(
                 f'Moving {module.__class__.__name__} to CUDA device {rank}')
             module.to(f'cuda:{rank}')
+            # models are only used for inference
+            if callable(getattr(module, 'eval', None)):
+                module.eval()
             # Optionally, verify the device assignment
             logger.debug(
                 f'{module.__class__.__name__} is on device {module.device}')
 
 
+def _get_zoo_key(model_key):
+    # model keys from different `prepare_model` calls with the same
+    # arguments, or copied to worker processes, share one entry
+    return (model_key.func, model_key.args,
+            frozenset(model_key.keywords.items()))
+
+
+def _drop_resolved_models(zoo_key):
+    for key in [
+            key for key, (resolved_zoo_key, _) in _RESOLVED_MODELS.items()
+            if resolved_zoo_key == zoo_key
+    ]:
+        del _RESOLVED_MODELS[key]
+
+
+def _evict_model(zoo_key):
+    entry = MODEL_ZOO.pop(zoo_key)
+    _drop_resolved_models(zoo_key)
+    logger.debug(f'Evict {zoo_key[0].__name__} model from MODEL_ZOO')
+
+    if entry['device'] is not None:
+        import torch
+        model = entry['obj']
+        for module in model if isinstance(model, tuple) else (model, ):
+            if callable(getattr(module, 'cpu', None)) and \
+                    not getattr(module, 'is_quantized', False):
+                module.cpu()
+        del model, entry
+        torch.cuda.empty_cache()
+
+
+def _add_to_model_zoo(zoo_key, model):
+    MODEL_ZOO[zoo_key] = {'obj': model, 'device': None}
+    while len(MODEL_ZOO) > MAX_MODELS:
+        _evict_model(next(iter(MODEL_ZOO)))
+
+
+def clear_model_zoo():
+    """
+    Remove all the loaded models from MODEL_ZOO.
+    """
+    while MODEL_ZOO:
+        _evict_model(next(iter(MODEL_ZOO)))
+
+
 def get_model(model_key=None, rank=None):
+    # fast path for models already loaded and placed for this rank, since
+    # ops call `get_model` in their per-sample functions
+    resolved = _RESOLVED_MODELS.get((model_key, rank))
+    if resolved is not None:
+        zoo_key, model = resolved
+        MODEL_ZOO.move_to_end(zoo_key)
+        return model
+
     if model_key is None:
         return None
 
-    global MODEL_ZOO
-    if model_key not in MODEL_ZOO:
-        logger.debug(
-            f'{model_key} not found in MODEL_ZOO ({mp.current_process().name})'
-        )
-        MODEL_ZOO[model_key] = model_key()
+    zoo_key = _get_zoo_key(model_key)
+    if zoo_key not in MODEL_ZOO:
+        process_name = mp.current_process().name
+        if process_name != 'MainProcess' and mp.get_start_method() == 'fork':
+            logger.warning(f'{model_key} not found in MODEL_ZOO '
+                           f'({process_name}), it may not be prewarmed')
+        else:
+            logger.debug(
+                f'{model_key} not found in MODEL_ZOO ({process_name})')
+        _add_to_model_zoo(zoo_key, model_key())
+    else:
+        MODEL_ZOO.move_to_end(zoo_key)
+    entry = MODEL_ZOO[zoo_key]
     if use_cuda():
-        rank = 0 if rank is None else rank
-        move_to_cuda(MODEL_ZOO[model_key], rank)
-    return MODEL_ZOO[model_key]
+        cuda_rank = 0 if rank is None else rank
+        device = f'cuda:{cuda_rank}'
+        # skip moving models that are already placed on the target device
+        if entry['device'] != device:
+            move_to_cuda(entry['obj'], cuda_rank)
+            entry['device'] = device
+            # the model is no longer on the devices of other ranks
+            _drop_resolved_models(zoo_key)
+    _RESOLVED_MODELS[(model_key, rank)] = (zoo_key, entry['obj'])
+    return entry['obj']
+
+
+def collect_model_keys(op):
+    """
+    Collect the model keys registered by an op (or by the ops fused in it).
+
+    :param op: an op instance
+    :return: a list of model keys
+    """
+    model_keys = [
+        value for name, value in vars(op).items()
+        if name.endswith('model_key') and value is not None
+    ]
+    for fused_op in getattr(op, 'fused_filters', []):
+        model_keys.extend(collect_model_keys(fused_op))
+    return model_keys
+
+
+def prewarm_models(model_keys):
+    """
+    Load models on the main process before worker processes are created.
+    With the fork start method, workers inherit the loaded models through
+    copy-on-write instead of each loading its own copy. For the other start
+    methods the models are reloaded in workers anyway, so nothing is done.
+
+    :param model_keys: model keys returned by `prepare_model`
+    """
+    if mp.get_start_method() != 'fork':
+        return
+    for model_key in model_keys:
+        get_model(model_key)
@@ -0,0 +1,500 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from data_juicer.utils import model_utils
+from data_juicer.utils.model_utils import (MODEL_FUNCTION_MAPPING, MODEL_ZOO,
+                                           check_model, clear_model_zoo,
+                                           get_backup_model_link, get_model,
+                                           get_model_link, prepare_model)
+
+
+class _ModelFileHandler(BaseHTTPRequestHandler):
+    """Serve files of the server with support for Range and If-Range."""
+
+    def log_message(self, *args):
+        pass
+
+    def _get_file(self):
+        return self.server.files.get(self.path)
+
+    def do_HEAD(self):
+        file = self._get_file()
+        if file is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(file['content'])))
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        file = self._get_file()
+        if file is None:
+            self.send_error(404)
+            return
+        content = file['content']
+        start = 0
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and self.server.support_range and \
+                (if_range is None or if_range == file['etag']):
+            start = int(range_header[len('bytes='):].split('-')[0])
+            if start >= len(content):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                'Content-Range',
+                f'bytes {start}-{len(content) - 1}/{len(content)}')
+        else:
+            self.send_response(200)
+        self.send_header('ETag', file['etag'])
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        if file['truncate'] is not None:
+            # break the connection in the middle of the body
+            self.wfile.write(content[start:start + file['truncate']])
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+
+class ModelLinkTest(unittest.TestCase):
+
+    def test_get_backup_model_link(self):
+        self.assertEqual(
+            get_backup_model_link('lid.176.bin'),
+            'https://dl.fbaipublicfiles.com/fasttext/supervised-models/')
+        self.assertEqual(
+            get_backup_model_link('en.sp.model'),
+            'https://huggingface.co/edugp/kenlm/resolve/main/wikipedia/')
+        self.assertIsNone(get_backup_model_link('en.sp.model.bak'))
+        self.assertIsNone(get_backup_model_link('unknown.bin'))
+
+    def test_get_model_link(self):
+        self.assertEqual(get_model_link('https://host/models', 'a.bin'),
+                         'https://host/models/a.bin')
+        self.assertEqual(get_model_link('https://host/models/', 'a.bin'),
+                         'https://host/models/a.bin')
+
+
+class ModelDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _ModelFileHandler)
+        self.server.files = {}
+        self.server.requests = []
+        self.server.support_range = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _add_file(self, path, content, etag='"v1"', truncate=None):
+        self.server.files[path] = {
+            'content': content,
+            'etag': etag,
+            'truncate': truncate
+        }
+        return self.base_url + path
+
+    def _write_part(self, dest, content, url, validator='"v1"'):
+        part_path = model_utils._get_part_path(dest, url)
+        with open(part_path, 'wb') as f:
+            f.write(content)
+        with open(part_path + '.json', 'w') as f:
+            json.dump({'url': url, 'validator': validator}, f)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        url = self._add_file('/model.bin', b'0123456789')
+        dest = os.path.join(self.tmp_dir, 'model.bin')
+        self.assertEqual(model_utils._download_with_resume(url, dest), dest)
+        self.assertEqual(self._read(dest), b'0123456789')
+        part_path = model_utils._get_part_path(dest, url)
+        self.assertFalse(os.path.exists(part_path))
+        self.assertFalse(os.path.exists(part_path + '.json'))
+
+    def test_resume_partial_content(self):
+        url = self._add_file('/model.bin', b'0123456789')
+        dest = os.path.join(self.tmp_dir, 'model.bin')
+        self._write_part(dest, b'0123', url)
+        model_utils._download_with_resume(url, dest)
+        self.assertEqual(self._read(dest), b'0123456789')
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers['Range'], 'bytes=4-')
+        self.assertEqual(headers['If-Range'], '"v1"')
+
+    def test_resume_range_not_supported(self):
+        self.server.support_range = False
+        url = self._add_file('/model.bin', b'0123456789')
+        dest = os.path.join(self.tmp_dir, 'model.bin')
+        self._write_part(dest, b'xxxx', url)
+        model_utils._download_with_resume(url, dest)
+        self.assertEqual(self._read(dest), b'0123456789')
+
+    def test_resume_range_not_satisfiable(self):
+        url = self._add_file('/model.bin', b'0123456789')
+        dest = os.path.join(self.tmp_dir, 'model.bin')
+        self._write_part(dest, b'0123456789xx', url)
+        model_utils._download_with_resume(url, dest)
+        self.assertEqual(self._read(dest), b'0123456789')
+
+    def test_resume_changed_remote_file(self):
+        url = self._add_file('/model.bin', b'abcdefghij', etag='"v2"')
+        dest = os.path.join(self.tmp_dir, 'model.bin')
+        self._write_part(dest, b'0123', url, validator='"v1"')
+        model_utils._download_with_resume(url, dest)
+        self.assertEqual(self._read(dest), b'abcdefghij')
+
+    def test_resume_from_another_url(self):
+        url = self._add_file('/model.bin', b'abcdefghij')
+        dest = os.path.join(self.tmp_dir, 'model.bin')
+        self._write_part(dest, b'0123', self.base_url + '/other/model.bin')
+        model_utils._download_with_resume(url, dest)
+        self.assertEqual(self._read(dest), b'abcdefghij')
+        self.assertNotIn('Range', self.server.requests[-1][1])
+
+    def test_race_mirrors(self):
+        url = self._add_file('/model.bin', b'0123456789')
+        missing_url = self.base_url + '/missing/model.bin'
+        self.assertEqual(model_utils._race_mirrors([missing_url, url]), url)
+        self.assertIsNone(
+            model_utils._race_mirrors(
+                [missing_url, self.base_url + '/missing/other']))
+        # a single link is returned without probing
+        self.assertEqual(model_utils._race_mirrors([missing_url]), missing_url)
+        self.assertIsNone(model_utils._race_mirrors([]))
+
+    def test_check_model(self):
+        model_name = 'test_check_model.bin'
+        self._add_file('/primary/' + model_name, b'0123456789')
+        with mock.patch.object(model_utils, 'DJMC', self.tmp_dir), \
+                mock.patch.object(model_utils, 'MODEL_LINKS',
+                                  self.base_url + '/primary/'):
+            cached_model_path = check_model(model_name)
+            self.assertEqual(cached_model_path,
+                             os.path.join(self.tmp_dir, model_name))
+            self.assertEqual(self._read(cached_model_path), b'0123456789')
+
+            # an existing model is not downloaded again
+            num_requests = len(self.server.requests)
+            check_model(model_name)
+            self.assertEqual(len(self.server.requests), num_requests)
+
+            # an invalid model is downloaded again forcefully
+            with open(cached_model_path, 'wb') as f:
+                f.write(b'broken')
+            check_model(model_name, force=True)
+            self.assertEqual(self._read(cached_model_path), b'0123456789')
+
+    def test_check_model_backup_link(self):
+        model_name = 'en.sp.model'
+        self._add_file('/backup/' + model_name, b'0123456789')
+        with mock.patch.object(model_utils, 'DJMC', self.tmp_dir), \
+                mock.patch.object(model_utils, 'MODEL_LINKS',
+                                  self.base_url + '/primary/'), \
+                mock.patch.object(model_utils, 'get_backup_model_link',
+                                  return_value=self.base_url + '/backup/'):
+            cached_model_path = check_model(model_name)
+            self.assertEqual(self._read(cached_model_path), b'0123456789')
+
+    def test_check_model_resume_partial_download(self):
+        model_name = 'en.sp.model'
+        primary_url = self._add_file('/primary/' + model_name, b'0123456789')
+        backup_url = self._add_file('/backup/' + model_name, b'0123456789')
+        cached_model_path = os.path.join(self.tmp_dir, model_name)
+        self._write_part(cached_model_path, b'0123', backup_url)
+        with mock.patch.object(model_utils, 'DJMC', self.tmp_dir), \
+                mock.patch.object(model_utils, 'MODEL_LINKS',
+                                  self.base_url + '/primary/'), \
+                mock.patch.object(model_utils, 'get_backup_model_link',
+                                  return_value=self.base_url + '/backup/'), \
+                mock.patch.object(model_utils, '_race_mirrors',
+                                  return_value=primary_url) as race_mirrors:
+            check_model(model_name)
+            race_mirrors.assert_not_called()
+        self.assertEqual(self._read(cached_model_path), b'0123456789')
+        self.assertEqual(self.server.requests,
+                         [('/backup/' + model_name, mock.ANY)])
+        self.assertEqual(self.server.requests[0][1]['Range'], 'bytes=4-')
+
+    def test_check_model_keep_partial_downloads(self):
+        model_name = 'en.sp.model'
+        primary_url = self._add_file('/primary/' + model_name,
+                                     b'0123456789',
+                                     truncate=4)
+        backup_url = self._add_file('/backup/' + model_name,
+                                    b'0123456789',
+                                    truncate=2)
+        cached_model_path = os.path.join(self.tmp_dir, model_name)
+        primary_part_path = model_utils._get_part_path(cached_model_path,
+                                                       primary_url)
+        backup_part_path = model_utils._get_part_path(cached_model_path,
+                                                      backup_url)
+        download = partial(model_utils._download_with_resume, chunk_size=2)
+        with mock.patch.object(model_utils, 'DJMC', self.tmp_dir), \
+                mock.patch.object(model_utils, 'MODEL_LINKS',
+                                  self.base_url + '/primary/'), \
+                mock.patch.object(model_utils, 'get_backup_model_link',
+                                  return_value=self.base_url + '/backup/'), \
+                mock.patch.object(model_utils, '_download_with_resume',
+                                  download):
+            # both links break in the middle, each keeps its own part
+            with self.assertRaises(SystemExit):
+                check_model(model_name)
+            self.assertEqual(self._read(primary_part_path), b'0123')
+            self.assertEqual(self._read(backup_part_path), b'01')
+
+            # the largest part is resumed, and the others are removed
+            self.server.files['/primary/' + model_name]['truncate'] = None
+            check_model(model_name)
+        self.assertEqual(self._read(cached_model_path), b'0123456789')
+        self.assertEqual(self.server.requests[-1][1]['Range'], 'bytes=4-')
+        self.assertFalse(os.path.exists(primary_part_path))
+        self.assertFalse(os.path.exists(backup_part_path))
+
+    def test_check_model_downloaded_while_waiting(self):
+        model_name = 'test_check_model.bin'
+        cached_model_path = os.path.join(self.tmp_dir, model_name)
+
+        class _Lock:
+            """Simulate another process downloading the model while the
+            current one is waiting for the lock."""
+
+            def __init__(self, path):
+                pass
+
+            def __enter__(self):
+                with open(cached_model_path, 'wb') as f:
+                    f.write(b'0123456789')
+
+            def __exit__(self, *args):
+                pass
+
+        with mock.patch.object(model_utils, 'DJMC', self.tmp_dir), \
+                mock.patch.object(model_utils.fasteners, 'InterProcessLock',
+                                  _Lock), \
+                mock.patch.object(model_utils,
+                                  '_download_with_resume') as download:
+            self.assertEqual(check_model(model_name), cached_model_path)
+            download.assert_not_called()
+
+
+class DecompressModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmp_dir, 'model.zip')
+        with zipfile.ZipFile(self.zip_path, 'w') as zf:
+            zf.writestr('model/', '')
+            zf.writestr('model/config.cfg', 'config')
+            zf.writestr('model/weights.bin', '0123456789')
+        self.model_path = os.path.join(self.tmp_dir, 'model')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _read(self, name):
+        with open(os.path.join(self.model_path, name)) as f:
+            return f.read()
+
+    def test_decompress(self):
+        self.assertEqual(
+            model_utils._decompress_model(self.zip_path, self.tmp_dir),
+            self.model_path)
+        self.assertEqual(self._read('config.cfg'), 'config')
+        self.assertEqual(self._read('weights.bin'), '0123456789')
+        self.assertTrue(os.path.exists(self.model_path + '.extracted'))
+
+    def test_resume_interrupted_decompression(self):
+        # an interrupted extraction leaves a partial dir without marker
+        os.makedirs(self.model_path)
+        with open(os.path.join(self.model_path, 'config.cfg'), 'w') as f:
+            f.write('config')
+        with open(os.path.join(self.model_path, 'weights.bin'), 'w') as f:
+            f.write('01234')
+        config_mtime = os.path.getmtime(
+            os.path.join(self.model_path, 'config.cfg'))
+
+        model_utils._decompress_model(self.zip_path, self.tmp_dir)
+        self.assertEqual(self._read('weights.bin'), '0123456789')
+        # the complete member is not extracted again
+        self.assertEqual(
+            os.path.getmtime(os.path.join(self.model_path, 'config.cfg')),
+            config_mtime)
+
+    def test_force_decompression(self):
+        model_utils._decompress_model(self.zip_path, self.tmp_dir)
+        with open(os.path.join(self.model_path, 'weights.bin'), 'w') as f:
+            f.write('broken')
+
+        model_utils._decompress_model(self.zip_path, self.tmp_dir)
+        self.assertEqual(self._read('weights.bin'), 'broken')
+        model_utils._decompress_model(self.zip_path, self.tmp_dir, force=True)
+        self.assertEqual(self._read('weights.bin'), '0123456789')
+
+    def test_illegal_member(self):
+        with zipfile.ZipFile(self.zip_path, 'w') as zf:
+            zf.writestr('../evil.txt', 'evil')
+        with self.assertRaises(ValueError):
+            model_utils._decompress_model(self.zip_path, self.tmp_dir)
+
+
+class HuggingFaceSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _snapshot_download(self, repo_files):
+
+        def snapshot_download(**kwargs):
+            from huggingface_hub.utils import filter_repo_objects
+            self.calls.append(kwargs)
+            for file in filter_repo_objects(
+                    repo_files, allow_patterns=kwargs['allow_patterns']):
+                open(os.path.join(self.tmp_dir, file), 'w').close()
+            return self.tmp_dir
+
+        return mock.patch('huggingface_hub.snapshot_download',
+                          snapshot_download)
+
+    def test_safetensors_weights(self):
+        with self._snapshot_download([
+                'config.json', 'model.safetensors', 'pytorch_model.bin',
+                'consolidated.safetensors'
+        ]):
+            self.assertEqual(
+                model_utils._snapshot_huggingface_model('org/model'),
+                self.tmp_dir)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         ['config.json', 'model.safetensors'])
+
+    def test_sharded_safetensors_weights(self):
+        with self._snapshot_download([
+                'config.json', 'model.safetensors.index.json',
+                'model-00001-of-00002.safetensors',
+                'model-00002-of-00002.safetensors', 'consolidated.safetensors'
+        ]):
+            model_utils._snapshot_huggingface_model('org/model')
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), [
+            'config.json', 'model-00001-of-00002.safetensors',
+            'model-00002-of-00002.safetensors', 'model.safetensors.index.json'
+        ])
+
+    def test_pytorch_weights(self):
+        repo_files = ['config.json', 'pytorch_model.bin', 'training_args.bin']
+        with self._snapshot_download(repo_files):
+            model_utils._snapshot_huggingface_model('org/model')
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         ['config.json', 'pytorch_model.bin'])
+
+
+class MoveToCudaTest(unittest.TestCase):
+
+    def test_skip_modules_on_device(self):
+        module = mock.Mock(device='cuda:1', is_quantized=False)
+        model_utils.move_to_cuda((module, 'processor'), 1)
+        module.to.assert_not_called()
+
+    def test_move_modules(self):
+        module = mock.Mock(device='cpu', is_quantized=False)
+        model_utils.move_to_cuda(module, 1)
+        module.to.assert_called_once_with('cuda:1')
+        module.eval.assert_called_once_with()
+
+    def test_quantized_modules_on_another_device(self):
+        module = mock.Mock(device='cuda:0', is_quantized=True)
+        with self.assertRaises(ValueError):
+            model_utils.move_to_cuda(module, 1)
+        module.to.assert_not_called()
+
+
+class ModelZooTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loaded = []
+
+        def prepare_fake_model(name):
+            self.loaded.append(name)
+            return object()
+
+        self.mapping_patcher = mock.patch.dict(MODEL_FUNCTION_MAPPING,
+                                               {'fake': prepare_fake_model})
+        self.mapping_patcher.start()
+        self.max_models_patcher = mock.patch.object(model_utils, 'MAX_MODELS',
+                                                    2)
+        self.max_models_patcher.start()
+        clear_model_zoo()
+
+    def tearDown(self):
+        clear_model_zoo()
+        self.max_models_patcher.stop()
+        self.mapping_patcher.stop()
+
+    def test_identical_model_keys(self):
+        key_a = prepare_model('fake', name='a')
+        key_b = prepare_model('fake', name='a')
+        self.assertIs(get_model(key_a), get_model(key_b))
+        self.assertEqual(self.loaded, ['a'])
+        self.assertEqual(len(MODEL_ZOO), 1)
+
+    def test_eager_loading(self):
+        key_a = prepare_model('fake', lazy=False, name='a')
+        self.assertEqual(self.loaded, ['a'])
+        get_model(key_a)
+        self.assertEqual(self.loaded, ['a'])
+
+    def test_lru_eviction(self):
+        key_a = prepare_model('fake', name='a')
+        key_b = prepare_model('fake', name='b')
+        key_c = prepare_model('fake', name='c')
+        model_a = get_model(key_a)
+        get_model(key_b)
+        # refresh a, so that b is the least recently used one
+        self.assertIs(get_model(key_a), model_a)
+        get_model(key_c)
+        self.assertEqual(self.loaded, ['a', 'b', 'c'])
+        self.assertEqual(
+            [key[2] for key in MODEL_ZOO],
+            [frozenset({('name', 'a')}),
+             frozenset({('name', 'c')})])
+
+        # a is still cached while b is loaded again
+        self.assertIs(get_model(key_a), model_a)
+        get_model(key_b)
+        self.assertEqual(self.loaded, ['a', 'b', 'c', 'b'])
+
+    def test_clear_model_zoo(self):
+        key_a = prepare_model('fake', name='a')
+        model_a = get_model(key_a)
+        clear_model_zoo()
+        self.assertEqual(len(MODEL_ZOO), 0)
+        self.assertIsNot(get_model(key_a), model_a)
+        self.assertEqual(self.loaded, ['a', 'a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,7 @@ from pyspark.sql.functions import col, rand, udf
 from pyspark.sql.types import ArrayType, DoubleType, IntegerType, StringType
 
 from data_juicer.utils.cache_utils import DATA_JUICER_MODELS_CACHE
-from data_juicer.utils.model_utils import (MODEL_LINKS,
+from data_juicer.utils.model_utils import (MODEL_LINKS, get_model_link,
                                            prepare_sentencepiece_model)
 
 
@@ -69,7 +69,7 @@ def prepare_model(model_name, model_path=DATA_JUICER_MODELS_CACHE):
         exit(0)
     # No specific models in local file systems. Download them from remote.
     os.makedirs(model_path, exist_ok=True)
-    wget.download(os.path.join(MODEL_LINKS, f'{model_name}.zip'),
+    wget.download(get_model_link(MODEL_LINKS, f'{model_name}.zip'),
                   os.path.join(model_path, f'{model_name}.zip'),
                   bar=None)
     # extract the compressed model file into a model directory